@@ -1,15 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import numexpr as ne
 import io
-from urllib.parse import urlparse
+import re
+import xlsxwriter
 import plotly.graph_objects as go
 
-# Function to normalize values to a 0-10 scale
-def normalize(value, min_value, max_value):
-    return 10 * (value - min_value) / (max_value - min_value)
-
 # Function to generate a template Excel file for user download
+@st.cache_data
 def create_template():
     data = {
         'Referring page title': ['Page 1', 'Page 2'],
@@ -30,63 +29,148 @@ def create_template():
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine="openpyxl") as writer:
         df.to_excel(writer, index=False)
-    output.seek(0)
-    return output
+    return output.getvalue()
+
+# Columns the scoring needs from an uploaded file
+REQUIRED_COLUMNS = ['Referring page title', 'Referring page URL', 'Domain rating', 'UR', 'Referring domains',
+                    'Page traffic', 'Anchor', 'Link Type', 'Nofollow', 'Sponsored', 'Lost Date', 'First Seen', 'Last Seen']
+
+# Function to load uploaded backlink data, parsed once per file
+@st.cache_data(max_entries=4)
+def load_excel(file_bytes):
+    # calamine is much faster on large workbooks; openpyxl (read-only) is the fallback
+    try:
+        import python_calamine  # noqa: F401
+        engine = "calamine"
+    except ImportError:
+        engine = "openpyxl"
+    # Read every column: anything beyond REQUIRED_COLUMNS is carried through to the export
+    return pd.read_excel(io.BytesIO(file_bytes), engine=engine)
+
+# Function to write a scored DataFrame to xlsx bytes, streaming rows with xlsxwriter.
+# constant_memory flushes each row once the next one starts, so rows must be written
+# in order (DataFrame.to_excel writes column by column and would lose data).
+def to_excel_bytes(df):
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'strings_to_urls': False,
+                                          'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, list(df.columns))
+    # Box values (NaN -> None for blank cells) a slice at a time, not the whole frame at once
+    chunk_size = 10000
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+        for row_num, row in enumerate(rows, start=start + 1):
+            worksheet.write_row(row_num, 0, row)
+    workbook.close()
+    return output.getvalue()
 
 # Function to clean up columns
 def clean_data(df):
-    df['Nofollow'] = df['Nofollow'].astype(str).str.strip()
-    df['Sponsored'] = df['Sponsored'].astype(str).str.strip()
+    # Parse the TRUE/FALSE flags to booleans once
+    df['Nofollow'] = df['Nofollow'].astype(str).str.strip().str.upper().eq('TRUE')
+    df['Sponsored'] = df['Sponsored'].astype(str).str.strip().str.upper().eq('TRUE')
+    # Link type has only a handful of values, so compare it as a categorical
+    df['Link Type'] = df['Link Type'].astype('category')
     df['Lost Date'] = df['Lost Date'].fillna('').astype(str).str.strip()
+    # Helper columns for scoring (prefixed with _); dropped again after scoring
+    df['_anchor_lower'] = df['Anchor'].fillna('').astype(str).str.lower()
+    # Only string titles are lowercased; anything else stays missing and scores 0. An all-blank
+    # or all-numeric title column is read as a numeric dtype, which has no .str accessor.
+    titles = df['Referring page title']
+    if pd.api.types.is_string_dtype(titles.dtype):
+        df['_title_lower'] = titles.astype(object).str.lower()
+    else:
+        df['_title_lower'] = pd.Series(np.nan, index=df.index, dtype=object)
+    # Link type score adjustment, looked up once per category
+    df['_lt_adj'] = df['Link Type'].map({'text': 2, 'image': -2, 'nav': -2}).astype(float).fillna(0).astype('int8')
     return df
 
-# Function to score title relevance
-def title_relevance_score(title, keyword):
-    if not isinstance(title, str):
-        return 0
-    title_lower = title.lower()
-    keyword_lower = keyword.lower()
-    if keyword_lower in title_lower:
-        return 1.0  # Exact match
-    elif any(part in title_lower for part in keyword_lower.split()):
-        return 0.5  # Partial match
+# Function to score title relevance (expects lowercased titles and keyword)
+def title_relevance_score(titles_lower, keyword_lower):
+    missing = titles_lower.isna().to_numpy()
+    exact = titles_lower.str.contains(keyword_lower, regex=False, na=False).to_numpy()
+    parts = keyword_lower.split()
+    if parts:
+        pattern = '|'.join(re.escape(part) for part in parts)
+        partial = titles_lower.str.contains(pattern, regex=True, na=False).to_numpy()
     else:
-        return -1.0  # Not relevant
-
-# Function to calculate score for a backlink
-def calculate_score(row, anchor_keywords, weights):
-    if row['Nofollow'].upper() == 'TRUE' or row['Sponsored'].upper() == 'TRUE' or row['Lost Date'] != '':
-        return 0
-
-    normalized_dr = normalize(row['Domain rating'], 0, 100)
-    normalized_ur = normalize(row['UR'], 0, 100)
-    normalized_rd = normalize(row['Referring domains'], 0, 5000)
-    normalized_traffic = normalize(row['Page traffic'], 0, 1000000)
-
-    anchor_bonus = sum(1 for keyword in anchor_keywords if keyword.lower() in str(row['Anchor']).lower())
-
-    link_type_adjustment = 2 if row['Link Type'] == 'text' else -2 if row['Link Type'] in ['image', 'nav'] else 0
-
-    title_bonus = 0
-    if anchor_keywords:
-        title_bonus = title_relevance_score(row['Referring page title'], anchor_keywords[0])
-
-    score = ((normalized_dr * weights['DR']) +
-             (normalized_ur * weights['UR']) +
-             (normalized_rd * weights['RD']) +
-             (normalized_traffic * weights['Traffic']) +
-             (anchor_bonus * 0.10) +
-             (link_type_adjustment * 0.05) +
-             title_bonus)
-
-    return round(score, 1)
+        partial = np.zeros(len(titles_lower), dtype=bool)
+    return np.select([missing, exact, partial],
+                     [0.0, 1.0, 0.5],  # No title, exact match, partial match
+                     default=-1.0).astype(np.float32)  # Not relevant
+
+# Function to calculate scores for all backlinks at once
+def calculate_scores(df, anchor_keywords, weights):
+    # float32 halves the memory the scoring pass has to stream through; the frame's
+    # own columns keep their parsed dtype so the export is unchanged
+    dr, ur, rd, traffic = (pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float32)
+                           for col in ('Domain rating', 'UR', 'Referring domains', 'Page traffic'))
+
+    # Each metric is normalized to a 0-10 scale; fold that into its weight.
+    # Everything stays float32 so numexpr doesn't upcast the columns.
+    w_dr = np.float32(weights['DR'] * 10 / 100)
+    w_ur = np.float32(weights['UR'] * 10 / 100)
+    w_rd = np.float32(weights['RD'] * 10 / 5000)
+    w_traffic = np.float32(weights['Traffic'] * 10 / 1000000)
+
+    # One point per keyword found in the anchor text
+    keywords_lower = [keyword.lower() for keyword in anchor_keywords]
+    anchor_bonus = np.zeros(len(df), dtype=np.float32)
+    for keyword in keywords_lower:
+        anchor_bonus += df['_anchor_lower'].str.contains(keyword, regex=False).to_numpy()
+
+    link_type_adjustment = df['_lt_adj'].to_numpy().astype(np.float32)
+
+    title_bonus = np.float32(0)
+    if keywords_lower:
+        title_bonus = title_relevance_score(df['_title_lower'], keywords_lower[0])
+
+    anchor_weight = np.float32(0.10)
+    link_type_weight = np.float32(0.05)
+    score = ne.evaluate('dr * w_dr + ur * w_ur + rd * w_rd + traffic * w_traffic + '
+                        'anchor_bonus * anchor_weight + link_type_adjustment * link_type_weight + title_bonus')
+
+    # Nofollow, sponsored and lost links don't count
+    excluded = (df['Nofollow'].to_numpy() |
+                df['Sponsored'].to_numpy() |
+                (df['Lost Date'] != '').to_numpy())
+
+    # Round in float64 so exported scores don't carry float32 noise
+    return pd.Series(np.where(excluded, 0, score).astype(float).round(1), index=df.index)
+
+# Function to load, clean and score an upload, cached on its contents, keywords and weights.
+# Returns None if the upload is missing required columns.
+@st.cache_data(max_entries=16)
+def score_frame(file_bytes, anchor_keywords, weights):
+    df = load_excel(file_bytes)
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        return None
+    df = clean_data(df)
+    weights = dict(zip(('DR', 'UR', 'RD', 'Traffic'), weights))
+    df['Score'] = calculate_scores(df, list(anchor_keywords), weights)
+    df.drop(columns=['_anchor_lower', '_title_lower', '_lt_adj'], inplace=True)
+
+    # Penalize duplicate domains
+    df['Domain'] = df['Referring page URL'].astype(str).str.extract(r'^[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#]*)', expand=False).fillna('')
+    df = df.sort_values(by='Score', ascending=False)
+    df['Rank'] = df.groupby('Domain').cumcount()
+    # Halve with Python's round() so results match the per-row penalty exactly (np.round
+    # disagrees on some x.x5 ties); there are only a few hundred distinct scores to round
+    score = df['Score'].to_numpy()
+    unique_scores, score_codes = np.unique(score, return_inverse=True)
+    halved = np.array([round(value * 0.5, 1) for value in unique_scores.tolist()])[score_codes.reshape(-1)]
+    df['Score'] = np.where(df['Rank'].to_numpy() == 0, score, halved)
+    df.drop(columns=['Rank'], inplace=True)
+    return df
 
 # App title
 st.title('Backlink Scoring Dashboard')
 
 # Sidebar: Download template
 st.sidebar.subheader('Download Template')
-st.sidebar.download_button('Download Template', create_template(), file_name='backlink_template.xlsx')
+st.sidebar.download_button('Download Template', data=create_template(), file_name='backlink_template.xlsx')
 
 # Tabs: Controls | Dashboard
 tab1, tab2 = st.tabs(["Dashboard", "Controls"])
@@ -128,22 +212,10 @@ with tab1:
     uploaded_file = st.file_uploader("Upload backlink data (Excel)", type=['xlsx'])
 
     if uploaded_file:
-        df = pd.read_excel(uploaded_file)
-        df = clean_data(df)
-
-        required_columns = ['Referring page title', 'Referring page URL', 'Domain rating', 'UR', 'Referring domains',
-                            'Page traffic', 'Anchor', 'Link Type', 'Nofollow', 'Sponsored', 'Lost Date', 'First Seen', 'Last Seen']
-
-        if all(col in df.columns for col in required_columns):
-            df['Score'] = df.apply(calculate_score, axis=1, anchor_keywords=anchor_keywords, weights=weights)
-
-            # Penalize duplicate domains
-            df['Domain'] = df['Referring page URL'].apply(lambda x: urlparse(x).netloc)
-            df = df.sort_values(by='Score', ascending=False)
-            df['Rank'] = df.groupby('Domain').cumcount()
-            df['Score'] = df.apply(lambda row: row['Score'] if row['Rank'] == 0 else round(row['Score'] * 0.5, 1), axis=1)
-            df.drop(columns=['Rank'], inplace=True)
+        df = score_frame(uploaded_file.getvalue(), tuple(anchor_keywords),
+                         (weights['DR'], weights['UR'], weights['RD'], weights['Traffic']))
 
+        if df is not None:
             overall_score = df['Score'].sum().round(1)
             total_links_submitted = len(df)
 
@@ -152,15 +224,17 @@ with tab1:
             col2.metric("🔗 Total Links Submitted", total_links_submitted)
 
             st.subheader("Top 10 Links")
-            top_links = df[df['Score'] > 0].sort_values(by='Score', ascending=False).head(10)
-            top_links = top_links.reset_index(drop=True)
+            top_links = df.loc[df['Score'] > 0].nlargest(10, 'Score').reset_index(drop=True)
             top_links['Position'] = range(1, len(top_links) + 1)
             st.dataframe(top_links[['Position', 'Referring page title', 'Referring page URL', 'Score']], use_container_width=True, hide_index=True)
 
-            domain_summary = df.groupby('Domain').agg(
-                domain_score=('Score', 'sum'),
-                link_count=('Referring page URL', 'count')
-            ).reset_index().sort_values(by='domain_score', ascending=False).head(10)
+            # Sum scores and count links per domain over integer domain codes
+            domain_codes, domains = pd.factorize(df['Domain'])
+            domain_summary = pd.DataFrame({
+                'Domain': domains,
+                'domain_score': np.bincount(domain_codes, weights=df['Score'].to_numpy()),
+                'link_count': np.bincount(domain_codes, weights=df['Referring page URL'].notna().to_numpy()).astype(int)
+            }).nlargest(10, 'domain_score')
 
             fig = go.Figure()
             fig.add_trace(go.Bar(x=domain_summary['Domain'], y=domain_summary['domain_score'], name='Domain Score', marker_color='red'))
@@ -172,10 +246,6 @@ with tab1:
 
             st.plotly_chart(fig, use_container_width=True)
 
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False)
-            output.seek(0)
-            st.download_button('Download Scored Data', output, file_name="scored_backlinks.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            st.download_button('Download Scored Data', to_excel_bytes(df), file_name="scored_backlinks.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
         else:
             st.error("Missing required columns in uploaded file.")